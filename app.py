@@ -1,6 +1,10 @@
 import sqlite3
 import os
-from flask import Flask, render_template, request, url_for, redirect, flash, g
+import re
+import queue
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, render_template, stream_template, request, url_for, redirect, flash, g, get_flashed_messages, abort
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 
@@ -8,37 +12,198 @@ from flask_login import LoginManager, UserMixin, login_user, login_required, log
 
 # Define the path for the SQLite database
 DATABASE = os.path.join(os.getcwd(), 'instance', 'book_recommender.db')
+# Number of long-lived SQLite connections shared across requests
+DB_POOL_SIZE = 5
+# Seconds a request waits for a free pooled connection before failing with a 503
+DB_POOL_TIMEOUT = 10
+# Number of books shown per page on the index
+BOOKS_PER_PAGE = 50
 
 app = Flask(__name__)
 # IMPORTANT: Use a secure secret key in production
 app.config['SECRET_KEY'] = 'a_very_secret_key_for_recommendations'
+# KDF for new password hashes. scrypt is pinned explicitly because older Werkzeug
+# releases default to pbkdf2 with 600k iterations, which is far slower per login.
+# Existing hashes keep verifying, since check_password_hash reads the method from the hash.
+app.config['PASSWORD_HASH_METHOD'] = 'scrypt'
 
 # Initialize Flask-Login
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login' # Set the view function for login
 
+# Password hashing is CPU-bound; running it on a pool sized to the CPU count keeps
+# concurrent logins from oversubscribing the cores shared with other request threads.
+_hash_executor = ThreadPoolExecutor(max_workers=os.cpu_count())
+
+# --- SQL STATEMENTS ---
+
+# Request-path SQL is kept at module scope so every call passes the same
+# statement text and hits the connection's prepared statement cache.
+
+_SQL_LOAD_USER = 'SELECT id, username FROM users WHERE id = ?'
+
+_SQL_USER_BY_USERNAME = 'SELECT id, username, password_hash FROM users WHERE username = ?'
+
+_SQL_USER_EXISTS = 'SELECT id FROM users WHERE username = ?'
+
+_SQL_INSERT_USER = 'INSERT INTO users (username, password_hash) VALUES (?, ?)'
+
+# Only the columns each template renders are selected; the book list, for
+# example, never shows descriptions.
+
+# The index is paginated by keyset on (title, id): the next page starts after the
+# title and id of the last book shown, so SQLite never has to walk past skipped
+# rows, and the page still works if that book has since been deleted.
+_SQL_INDEX = '''
+    SELECT b.id, b.title, b.author, b.genre, br.avg_rating, br.review_count
+    FROM books b
+    LEFT JOIN book_ratings br ON b.id = br.book_id
+    ORDER BY b.title ASC, b.id ASC
+    LIMIT ?
+'''
+
+_SQL_INDEX_AFTER = '''
+    SELECT b.id, b.title, b.author, b.genre, br.avg_rating, br.review_count
+    FROM books b
+    LEFT JOIN book_ratings br ON b.id = br.book_id
+    WHERE (b.title, b.id) > (?, ?)
+    ORDER BY b.title ASC, b.id ASC
+    LIMIT ?
+'''
+
+_SQL_BOOK = 'SELECT id, title, author, genre, description FROM books WHERE id = ?'
+
+_SQL_BOOK_REVIEWS = '''
+    SELECT r.user_id, r.rating, r.review_text, u.username
+    FROM reviews r
+    JOIN users u ON r.user_id = u.id
+    WHERE r.book_id = ?
+    ORDER BY r.id DESC
+'''
+
+# Insert a new review, or update the user's existing one, in a single statement
+_SQL_UPSERT_REVIEW = '''
+    INSERT INTO reviews (user_id, book_id, rating, review_text) VALUES (?, ?, ?, ?)
+    ON CONFLICT (user_id, book_id) DO UPDATE SET
+        rating = excluded.rating,
+        review_text = excluded.review_text
+'''
+
+_SQL_RECOMMENDATIONS = '''
+    WITH favorite_genres AS (
+        SELECT b.genre
+        FROM reviews r
+        JOIN books b ON r.book_id = b.id
+        WHERE r.user_id = :user_id AND r.rating >= 4
+        GROUP BY b.genre
+        ORDER BY COUNT(b.genre) DESC
+        LIMIT 3
+    )
+    SELECT b.id, b.title, b.author, b.genre, b.description, br.avg_rating
+    FROM books b
+    LEFT JOIN book_ratings br ON b.id = br.book_id
+    WHERE b.genre IN (SELECT genre FROM favorite_genres)
+      AND b.id NOT IN (SELECT book_id FROM reviews WHERE user_id = :user_id)
+    ORDER BY br.avg_rating DESC, b.title ASC
+    LIMIT 5
+'''
+
+# Walks book_ratings in avg_rating order and stops after five unreviewed books,
+# rather than sorting the whole catalog. Unrated books are added afterwards by
+# _SQL_RECOMMENDATIONS_UNRATED when this returns fewer than five.
+# CROSS JOIN pins book_ratings as the outer loop so the avg_rating index is used.
+_SQL_RECOMMENDATIONS_FALLBACK = '''
+    SELECT b.id, b.title, b.author, b.genre, b.description, br.avg_rating
+    FROM book_ratings br
+    CROSS JOIN books b ON b.id = br.book_id
+    WHERE br.avg_rating IS NOT NULL
+      AND br.book_id NOT IN (SELECT book_id FROM reviews WHERE user_id = ?)
+    ORDER BY br.avg_rating DESC
+    LIMIT 5
+'''
+
+# Unrated books the user has not reviewed, to top up the fallback (they rank
+# below every rated book, as NULL ratings would under ORDER BY ... DESC)
+_SQL_RECOMMENDATIONS_UNRATED = '''
+    SELECT b.id, b.title, b.author, b.genre, b.description, NULL AS avg_rating
+    FROM books b
+    WHERE b.id NOT IN (SELECT book_id FROM book_ratings WHERE avg_rating IS NOT NULL)
+      AND b.id NOT IN (SELECT book_id FROM reviews WHERE user_id = ?)
+    ORDER BY b.title ASC
+    LIMIT ?
+'''
+
 # --- DATABASE UTILITIES ---
 
+# Lightweight row types for the list pages; fields match the SELECT column order
+BookRow = namedtuple('BookRow', ['id', 'title', 'author', 'genre', 'avg_rating', 'review_count'])
+RecommendedBookRow = namedtuple('RecommendedBookRow', ['id', 'title', 'author', 'genre', 'description', 'avg_rating'])
+
+def query_rows(db, row_type, sql, params=()):
+    """Runs a query and returns its rows as ``row_type`` namedtuples instead of sqlite3.Row."""
+    cursor = db.cursor()
+    cursor.row_factory = lambda cur, row: row_type(*row)
+    return cursor.execute(sql, params).fetchall()
+
+def _connect():
+    """Opens a new SQLite connection configured for use in the pool."""
+    # Check if the instance directory exists, create if not
+    os.makedirs(os.path.dirname(DATABASE), exist_ok=True)
+    # check_same_thread=False lets pooled connections move between request threads
+    db = sqlite3.connect(
+        DATABASE,
+        detect_types=sqlite3.PARSE_DECLTYPES,
+        check_same_thread=False,
+        cached_statements=256
+    )
+    db.row_factory = sqlite3.Row # Allows accessing columns by name
+    # WAL lets readers proceed during writes; NORMAL sync skips the fsync per commit
+    db.execute('PRAGMA journal_mode=WAL;')
+    db.execute('PRAGMA synchronous=NORMAL;')
+    db.execute('PRAGMA temp_store=MEMORY;')
+    db.execute('PRAGMA cache_size=-20000;') # ~20 MB page cache per connection
+    db.execute('PRAGMA mmap_size=268435456;')
+    db.execute('PRAGMA foreign_keys=ON;')
+    db.execute('PRAGMA cache_spill=OFF;')
+    return db
+
+# Process-wide pool of connections, checked out per request in get_db()
+_pool = queue.Queue(maxsize=DB_POOL_SIZE)
+for _ in range(DB_POOL_SIZE):
+    _pool.put(_connect())
+
 def get_db():
-    """Connects to the specific database."""
+    """Checks out a database connection from the pool for this request."""
     db = getattr(g, '_database', None)
     if db is None:
-        # Check if the instance directory exists, create if not
-        os.makedirs(os.path.dirname(DATABASE), exist_ok=True)
-        db = g._database = sqlite3.connect(
-            DATABASE,
-            detect_types=sqlite3.PARSE_DECLTYPES
-        )
-        db.row_factory = sqlite3.Row # Allows accessing columns by name
+        try:
+            db = _pool.get(timeout=DB_POOL_TIMEOUT)
+        except queue.Empty:
+            abort(503)
+        g._database = db
     return db
 
 @app.teardown_appcontext
 def close_connection(exception):
-    """Closes the database connection at the end of the request."""
-    db = getattr(g, '_database', None)
-    if db is not None:
+    """Returns the database connection to the pool at the end of the request."""
+    db = g.pop('_database', None)
+    if db is None:
+        return
+    try:
+        # Never hand an open transaction to the next request
+        if db.in_transaction:
+            db.rollback()
+        # Re-analyzes only tables whose statistics have drifted; usually a no-op
+        db.execute('PRAGMA optimize;')
+    except sqlite3.Error:
+        # A connection that could not be cleaned up is not safe to reuse; replace it.
+        # If reconnecting fails too, the closed connection goes back and is replaced
+        # at its next checkin, so the pool never shrinks.
         db.close()
+        db = _connect()
+    finally:
+        _pool.put(db)
 
 def init_db():
     """Initializes the database schema and populates sample data."""
@@ -46,17 +211,19 @@ def init_db():
         db = get_db()
         cursor = db.cursor()
 
-        # 1. Users Table
-        cursor.execute('''
+        # The whole schema is created in one transaction (left open for the seeding below),
+        # so a cold start pays a single commit instead of one per statement.
+        cursor.executescript('''
+            BEGIN;
+
+            -- 1. Users Table
             CREATE TABLE IF NOT EXISTS users (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 username TEXT UNIQUE NOT NULL,
                 password_hash TEXT NOT NULL
             );
-        ''')
 
-        # 2. Books Table
-        cursor.execute('''
+            -- 2. Books Table
             CREATE TABLE IF NOT EXISTS books (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 title TEXT NOT NULL,
@@ -64,10 +231,8 @@ def init_db():
                 genre TEXT NOT NULL,
                 description TEXT
             );
-        ''')
 
-        # 3. Reviews Table
-        cursor.execute('''
+            -- 3. Reviews Table
             CREATE TABLE IF NOT EXISTS reviews (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 user_id INTEGER NOT NULL,
@@ -78,10 +243,69 @@ def init_db():
                 FOREIGN KEY (book_id) REFERENCES books (id),
                 UNIQUE (user_id, book_id) -- Ensures one review per user per book
             );
+
+            -- 4. Indexes for the hot lookup paths
+            -- (book_id, rating) covers the per-book AVG(rating) used to maintain book_ratings.
+            CREATE INDEX IF NOT EXISTS idx_reviews_book_id ON reviews (book_id, rating);
+            -- (user_id, rating, book_id) covers the favorite-genre lookup for a user.
+            CREATE INDEX IF NOT EXISTS idx_reviews_user_rating ON reviews (user_id, rating, book_id);
+            CREATE INDEX IF NOT EXISTS idx_books_genre ON books (genre);
+            -- title (plus the implicit rowid) drives keyset pagination on the book list.
+            CREATE INDEX IF NOT EXISTS idx_books_title ON books (title);
+
+            -- 5. Per-book rating aggregates, kept in sync with reviews by triggers
+            -- The triggers use UPSERT rather than INSERT OR REPLACE: inside a trigger, the
+            -- conflict resolution of the outer statement (e.g. the review UPSERT) takes precedence.
+            CREATE TABLE IF NOT EXISTS book_ratings (
+                book_id INTEGER PRIMARY KEY,
+                avg_rating REAL,
+                review_count INTEGER NOT NULL DEFAULT 0,
+                FOREIGN KEY (book_id) REFERENCES books (id)
+            );
+            -- avg_rating drives the global top-rated recommendation fallback.
+            CREATE INDEX IF NOT EXISTS idx_book_ratings_avg ON book_ratings (avg_rating);
+
+            CREATE TRIGGER IF NOT EXISTS trg_reviews_insert AFTER INSERT ON reviews
+            BEGIN
+                INSERT INTO book_ratings (book_id, avg_rating, review_count)
+                SELECT NEW.book_id, AVG(rating), COUNT(*) FROM reviews WHERE book_id = NEW.book_id
+                ON CONFLICT (book_id) DO UPDATE SET
+                    avg_rating = excluded.avg_rating, review_count = excluded.review_count;
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS trg_reviews_update AFTER UPDATE OF book_id, rating ON reviews
+            BEGIN
+                INSERT INTO book_ratings (book_id, avg_rating, review_count)
+                SELECT OLD.book_id, AVG(rating), COUNT(*) FROM reviews WHERE book_id = OLD.book_id
+                ON CONFLICT (book_id) DO UPDATE SET
+                    avg_rating = excluded.avg_rating, review_count = excluded.review_count;
+                INSERT INTO book_ratings (book_id, avg_rating, review_count)
+                SELECT NEW.book_id, AVG(rating), COUNT(*) FROM reviews WHERE book_id = NEW.book_id
+                ON CONFLICT (book_id) DO UPDATE SET
+                    avg_rating = excluded.avg_rating, review_count = excluded.review_count;
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS trg_reviews_delete AFTER DELETE ON reviews
+            BEGIN
+                INSERT INTO book_ratings (book_id, avg_rating, review_count)
+                SELECT OLD.book_id, AVG(rating), COUNT(*) FROM reviews WHERE book_id = OLD.book_id
+                ON CONFLICT (book_id) DO UPDATE SET
+                    avg_rating = excluded.avg_rating, review_count = excluded.review_count;
+            END;
         ''')
 
+        # Backfill aggregates for reviews written before the triggers existed. Once
+        # book_ratings has rows the triggers keep it current, so later starts skip this.
+        if db.execute('SELECT 1 FROM book_ratings LIMIT 1').fetchone() is None:
+            cursor.execute('''
+                INSERT INTO book_ratings (book_id, avg_rating, review_count)
+                SELECT book_id, AVG(rating), COUNT(*) FROM reviews GROUP BY book_id;
+            ''')
+
         # Populate sample books if none exist
-        if db.execute('SELECT COUNT(*) FROM books').fetchone()[0] == 0:
+        seeded = db.execute('SELECT 1 FROM books LIMIT 1').fetchone() is None
+        if seeded:
+            print("Initializing database and adding sample data...")
             sample_books = [
                 ('The Shadow of the Wind', 'Carlos Ruiz Zafón', 'Mystery', 'A magical tale set in a Barcelona book graveyard.'),
                 ('The Martian', 'Andy Weir', 'Sci-Fi', 'An astronaut struggles to survive alone on Mars.'),
@@ -96,10 +320,56 @@ def init_db():
 
         db.commit()
 
-# Run the initialization only if the script is executed directly
-if not os.path.exists(DATABASE):
-    print("Initializing database and adding sample data...")
-    init_db()
+        # Give a freshly seeded database planner statistics from the start;
+        # afterwards PRAGMA optimize on connection checkin keeps them current
+        if seeded:
+            db.execute('ANALYZE;')
+        check_query_plans(db)
+
+# CTEs whose scans check_query_plans expects (they are small, per-user result sets)
+_PLAN_CHECK_CTES = {'favorite_genres'}
+# Statements whose ordered index walk is bounded by LIMIT (it stops once enough rows match)
+_PLAN_CHECK_BOUNDED_SCANS = {'_SQL_INDEX', '_SQL_RECOMMENDATIONS_UNRATED'}
+
+def check_query_plans(db):
+    """
+    Warns about full table scans in the request-path SQL, so a dropped or
+    missing index shows up at startup instead of as slow pages.
+    """
+    # Plan against an empty in-memory copy of the schema: once ANALYZE has run,
+    # the planner rightly prefers scans on small tables, which would be false alarms.
+    schema = db.execute(
+        "SELECT sql FROM sqlite_master WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%'"
+    ).fetchall()
+    plan_db = sqlite3.connect(':memory:')
+    for row in schema:
+        plan_db.execute(row['sql'])
+
+    for name, sql in globals().items():
+        if not name.startswith('_SQL_'):
+            continue
+        # Plans don't depend on the bound values, so NULL stands in for every parameter
+        named = re.findall(r':(\w+)', sql)
+        params = dict.fromkeys(named) if named else (None,) * sql.count('?')
+        for _, _, _, detail in plan_db.execute('EXPLAIN QUERY PLAN ' + sql, params):
+            if not detail.startswith('SCAN '):
+                continue
+            # Covering index scans never touch the table itself
+            if 'COVERING INDEX' in detail:
+                continue
+            if detail.split()[1] in _PLAN_CHECK_CTES:
+                continue
+            if name in _PLAN_CHECK_BOUNDED_SCANS and 'USING INDEX' in detail:
+                continue
+            print(f"Warning: {name} does a full scan ({detail}); is an index missing?")
+
+    plan_db.close()
+
+# Initialize the database on startup. The schema statements are idempotent, so
+# existing databases also pick up any newly added tables and indexes. (The pool has
+# already created the database file by now, so a new database is detected in
+# init_db by its empty books table rather than by the file's existence.)
+init_db()
 
 # --- USER MANAGEMENT (FLASK-LOGIN) ---
 
@@ -112,11 +382,16 @@ class User(UserMixin):
 @login_manager.user_loader
 def load_user(user_id):
     """Required function for Flask-Login to load a user by ID."""
+    # Memoize per request so repeated current_user lookups hit the database once
+    cache = g.setdefault('_user_cache', {})
+    if user_id in cache:
+        return cache[user_id]
+
     db = get_db()
-    user_data = db.execute('SELECT id, username FROM users WHERE id = ?', (user_id,)).fetchone()
-    if user_data:
-        return User(user_data['id'], user_data['username'])
-    return None
+    user_data = db.execute(_SQL_LOAD_USER, (user_id,)).fetchone()
+    user = User(user_data['id'], user_data['username']) if user_data else None
+    cache[user_id] = user
+    return user
 
 # --- RECOMMENDATION LOGIC ---
 
@@ -127,120 +402,71 @@ def get_recommendations(user_id):
     """
     db = get_db()
 
-    # 1. Find the genres the user rated highly (e.g., rating >= 4)
-    # This query joins reviews and books to get the genre of highly-rated books.
-    favorite_genres = db.execute('''
-        SELECT b.genre
-        FROM reviews r
-        JOIN books b ON r.book_id = b.id
-        WHERE r.user_id = ? AND r.rating >= 4
-        GROUP BY b.genre
-        ORDER BY COUNT(b.genre) DESC
-        LIMIT 3
-    ''', (user_id,)).fetchall()
-
-    if not favorite_genres:
-        # If no high ratings, recommend the overall highest-rated books globally
-        return db.execute('''
-            SELECT b.*, AVG(r.rating) as avg_rating
-            FROM books b
-            LEFT JOIN reviews r ON b.id = r.book_id
-            GROUP BY b.id
-            ORDER BY avg_rating DESC
-            LIMIT 5
-        ''').fetchall()
-
-    # Extract genre names
-    genres = [g['genre'] for g in favorite_genres]
-
-    # 2. Find unread/unreviewed books in those favorite genres
-    # Use IN clause for the genres and check if the user has NOT reviewed the book.
-    placeholders = ', '.join('?' for _ in genres)
-    
-    # Subquery to find all books the user has already reviewed
-    reviewed_books = db.execute('SELECT book_id FROM reviews WHERE user_id = ?', (user_id,)).fetchall()
-    reviewed_book_ids = [r['book_id'] for r in reviewed_books]
-    
-    # Build the main recommendation query
-    recommendation_query = f'''
-        SELECT b.*, AVG(r.rating) as avg_rating
-        FROM books b
-        LEFT JOIN reviews r ON b.id = r.book_id
-        WHERE b.genre IN ({placeholders})
-    '''
-    
-    # Add exclusion criteria for reviewed books
-    if reviewed_book_ids:
-        # Create placeholders for exclusion list
-        exclusion_placeholders = ', '.join('?' for _ in reviewed_book_ids)
-        recommendation_query += f' AND b.id NOT IN ({exclusion_placeholders})'
-        params = tuple(genres) + tuple(reviewed_book_ids)
-    else:
-        params = tuple(genres)
+    # Single statement: find the user's top genres (rated >= 4), then the
+    # highest-rated books in those genres that the user has not reviewed yet.
+    recommendations = query_rows(db, RecommendedBookRow, _SQL_RECOMMENDATIONS, {'user_id': user_id})
 
-    recommendation_query += '''
-        GROUP BY b.id
-        ORDER BY avg_rating DESC, b.title ASC
-        LIMIT 5
-    '''
-    
-    recommendations = db.execute(recommendation_query, params).fetchall()
-    
-    # Fallback: if no books match the favorite genres (e.g., all reviewed), return top global
+    # Fallback: no high ratings yet, or nothing left in the favorite genres;
+    # recommend the highest-rated books globally that the user has not reviewed
     if not recommendations:
-        return db.execute('''
-            SELECT b.*, AVG(r.rating) as avg_rating
-            FROM books b
-            LEFT JOIN reviews r ON b.id = r.book_id
-            WHERE b.id NOT IN ({exclusion_placeholders})
-            GROUP BY b.id
-            ORDER BY avg_rating DESC
-            LIMIT 5
-        ''').fetchall()
-
+        recommendations = query_rows(db, RecommendedBookRow, _SQL_RECOMMENDATIONS_FALLBACK, (user_id,))
+        # Top up with unrated books, e.g. on a new catalog with no reviews yet
+        if len(recommendations) < 5:
+            recommendations += query_rows(
+                db, RecommendedBookRow, _SQL_RECOMMENDATIONS_UNRATED, (user_id, 5 - len(recommendations))
+            )
 
     return recommendations
 
 # --- ROUTES ---
 
+class BookPage:
+    """
+    One page of the book list. next_after is the last book shown when another
+    page follows, and None otherwise.
+    """
+    def __init__(self, rows, after):
+        self.after = after
+        # The query fetches one row past the page; it only signals a next page
+        self.next_after = rows[BOOKS_PER_PAGE - 1] if len(rows) > BOOKS_PER_PAGE else None
+        self.books = rows[:BOOKS_PER_PAGE]
+
+    def __iter__(self):
+        return iter(self.books)
+
 @app.route('/')
 def index():
-    """Displays the list of all books."""
+    """Displays a page of books, starting after the ?title= and ?after= (id) given."""
+    after = request.args.get('after', type=int)
+    after_title = request.args.get('title')
+    if after_title is None:
+        after = None
     db = get_db()
-    books = db.execute('''
-        SELECT b.*, AVG(r.rating) as avg_rating, COUNT(r.id) as review_count
-        FROM books b
-        LEFT JOIN reviews r ON b.id = r.book_id
-        GROUP BY b.id
-        ORDER BY b.title ASC
-    ''').fetchall()
-    return render_template('index.html', books=books)
+    # Fetch one extra row to find out whether there is a next page. The rows are read
+    # before streaming starts: the request's app context (and with it the pooled
+    # connection) is torn down as soon as this view returns, before the body renders.
+    if after is None:
+        rows = query_rows(db, BookRow, _SQL_INDEX, (BOOKS_PER_PAGE + 1,))
+    else:
+        rows = query_rows(db, BookRow, _SQL_INDEX_AFTER, (after_title, after, BOOKS_PER_PAGE + 1))
+
+    # Consume flashed messages and load the user now, for the same reason: the session
+    # cookie is already written, and g._database already returned, once the body renders.
+    get_flashed_messages(with_categories=True)
+    current_user._get_current_object()
+    # Stream the rendered page so the browser can start on the markup right away
+    return stream_template('index.html', page=BookPage(rows, after))
 
 @app.route('/book/<int:book_id>', methods=['GET', 'POST'])
 def book_detail(book_id):
     """Displays book detail and handles review submission."""
     db = get_db()
-    book = db.execute('SELECT * FROM books WHERE id = ?', (book_id,)).fetchone()
+    book = db.execute(_SQL_BOOK, (book_id,)).fetchone()
     
     if not book:
         flash('Book not found.', 'error')
         return redirect(url_for('index'))
 
-    reviews = db.execute('''
-        SELECT r.*, u.username
-        FROM reviews r
-        JOIN users u ON r.user_id = u.id
-        WHERE r.book_id = ?
-        ORDER BY r.id DESC
-    ''', (book_id,)).fetchall()
-
-    user_review = None
-    if current_user.is_authenticated:
-        user_review = db.execute(
-            'SELECT * FROM reviews WHERE user_id = ? AND book_id = ?',
-            (current_user.id, book_id)
-        ).fetchone()
-
     if request.method == 'POST':
         if not current_user.is_authenticated:
             flash('You must be logged in to submit a review.', 'warning')
@@ -254,31 +480,24 @@ def book_detail(book_id):
             return redirect(url_for('book_detail', book_id=book_id))
 
         try:
-            if user_review:
-                # Update existing review
-                db.execute(
-                    'UPDATE reviews SET rating = ?, review_text = ? WHERE id = ?',
-                    (rating, review_text, user_review['id'])
-                )
-                flash('Your review has been updated!', 'success')
-            else:
-                # Insert new review
-                db.execute(
-                    'INSERT INTO reviews (user_id, book_id, rating, review_text) VALUES (?, ?, ?, ?)',
-                    (current_user.id, book_id, rating, review_text)
-                )
-                flash('Your review has been submitted!', 'success')
-            
+            db.execute(_SQL_UPSERT_REVIEW, (current_user.id, book_id, rating, review_text))
             db.commit()
+            flash('Your review has been saved!', 'success')
             return redirect(url_for('book_detail', book_id=book_id))
 
         except sqlite3.IntegrityError:
-            flash('Error submitting review. You may have already reviewed this book.', 'error')
+            flash('Error submitting review.', 'error')
             return redirect(url_for('book_detail', book_id=book_id))
         except Exception as e:
             flash(f'An unexpected error occurred: {e}', 'error')
             return redirect(url_for('book_detail', book_id=book_id))
 
+    reviews = db.execute(_SQL_BOOK_REVIEWS, (book_id,)).fetchall()
+
+    # The current user's review (if any) is already among the book's reviews
+    user_review = None
+    if current_user.is_authenticated:
+        user_review = next((r for r in reviews if r['user_id'] == current_user.id), None)
 
     return render_template('book_detail.html', book=book, reviews=reviews, user_review=user_review)
 
@@ -305,15 +524,12 @@ def register():
         cursor = db.cursor()
         
         # Check if user already exists
-        if db.execute('SELECT id FROM users WHERE username = ?', (username,)).fetchone():
+        if db.execute(_SQL_USER_EXISTS, (username,)).fetchone():
             flash('Username already taken. Please choose a different one.', 'error')
         else:
             # Hash password and insert user
-            password_hash = generate_password_hash(password)
-            cursor.execute(
-                'INSERT INTO users (username, password_hash) VALUES (?, ?)',
-                (username, password_hash)
-            )
+            password_hash = generate_password_hash(password, method=app.config['PASSWORD_HASH_METHOD'])
+            cursor.execute(_SQL_INSERT_USER, (username, password_hash))
             db.commit()
             flash('Registration successful! Please log in.', 'success')
             return redirect(url_for('login'))
@@ -331,12 +547,11 @@ def login():
         password = request.form['password']
         db = get_db()
         
-        user_data = db.execute(
-            'SELECT id, username, password_hash FROM users WHERE username = ?', 
-            (username,)
-        ).fetchone()
+        user_data = db.execute(_SQL_USER_BY_USERNAME, (username,)).fetchone()
 
-        if user_data and check_password_hash(user_data['password_hash'], password):
+        if user_data and _hash_executor.submit(
+            check_password_hash, user_data['password_hash'], password
+        ).result():
             user = User(user_data['id'], user_data['username'])
             login_user(user)
             flash(f'Welcome back, {username}!', 'success')
@@ -356,7 +571,5 @@ def logout():
     return redirect(url_for('index'))
 
 if __name__ == '__main__':
-    # Initial setup for sample data if run directly
-    if not os.path.exists(DATABASE):
-        init_db()
+    # The database was already initialized on import
     app.run(debug=True)